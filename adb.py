@@ -1,43 +1,251 @@
-import io
+import atexit
+import struct
 import subprocess
+import threading
+import numpy as np
 from PIL import Image
 import time
 import tempfile
 import os
 
+_DEVICE_ID = None
+_SHELL = None
+_SCREEN_BUF = bytearray()
+_SCREENCAP = None
+# Bytes between the 12-byte screencap header and the pixels (4 on newer Android), once known
+_EXTRA_HEADER = None
+# Seconds a single screencap may take before its process is killed
+SCREENCAP_TIMEOUT = 5.0
+
+
+def _get_shell():
+    """
+    Return a persistent `adb shell` process that taps are written to,
+    starting it (again) if needed so we don't spawn adb once per tap.
+    """
+    global _SHELL
+    if _SHELL is None or _SHELL.poll() is not None:
+        device_id = get_device_id()
+        if not device_id:
+            raise Exception("No ADB device found")
+        _SHELL = subprocess.Popen(
+            ["adb", "-s", device_id, "shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL
+        )
+    return _SHELL
+
+
+def _close_shells():
+    for proc in (_SHELL, _SCREENCAP):
+        if proc is not None and proc.poll() is None:
+            proc.stdin.close()
+            proc.wait()
+
+
+atexit.register(_close_shells)
+
+
 def adb_tap(x, y):
-    subprocess.run(["adb", "shell", "input", "tap", str(x), str(y)])
+    adb_taps([(x, y)])
+
+def adb_tap_pair(x1, y1, x2, y2):
+    """Tap two points back to back (e.g. source then destination tube) with one write."""
+    adb_taps([(x1, y1), (x2, y2)])
+
+def adb_taps(positions):
+    """Queue taps on every (x, y) in order with a single write to the adb shell."""
+    shell = _get_shell()
+    shell.stdin.write("".join(f"input tap {x} {y}\n" for x, y in positions).encode())
+    shell.stdin.flush()
 
 def get_device_id():
-    result = subprocess.run(["adb", "devices"], capture_output=True, text=True)
-    lines = result.stdout.strip().split('\n')[1:]  # Skip header
-    devices = [line.split()[0] for line in lines if '\tdevice' in line]
-    return devices[0] if devices else None
+    global _DEVICE_ID
+    if _DEVICE_ID is not None:
+        return _DEVICE_ID
+    result = subprocess.run(["adb", "devices"], capture_output=True)
+    lines = result.stdout.strip().split(b'\n')[1:]  # Skip header
+    devices = [line.split()[0].decode() for line in lines if b'\tdevice' in line]
+    _DEVICE_ID = devices[0] if devices else None
+    return _DEVICE_ID
+
+def _get_screencap_shell(device_id):
+    """
+    Return a persistent `adb shell -T sh` process that runs screencap on request,
+    so we don't launch a new adb process for every frame.
+    (`exec-out` doesn't forward stdin; `shell -T` does and, without a pty, keeps stdout binary-clean.)
+    """
+    global _SCREENCAP
+    if _SCREENCAP is None or _SCREENCAP.poll() is not None:
+        _SCREENCAP = subprocess.Popen(
+            ["adb", "-s", device_id, "shell", "-T", "sh"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+    return _SCREENCAP
+
+
+def _read_into(stream, view):
+    """Read from stream until view is full or the stream ends, returning the bytes read."""
+    received = 0
+    while received < len(view):
+        read = stream.readinto(view[received:])
+        if not read:
+            break
+        received += read
+    return received
+
+
+def _read_frame(proc):
+    """
+    Read one raw screencap frame from proc's stdout into the shared buffer.
+    Returns its width, height and number of pixel bytes.
+    """
+    global _SCREEN_BUF, _SCREENCAP, _EXTRA_HEADER
+    # Header is width, height, pixel format (and a colorspace field on newer Android),
+    # followed by width * height RGBA pixels
+    header = proc.stdout.read(12)
+    if len(header) < 12:
+        proc.kill()
+        _SCREENCAP = None
+        raise Exception("No framebuffer data found in screencap output")
+    width, height, pixel_format = struct.unpack("<III", header)
+    # Only RGBA_8888 (1) and RGBX_8888 (2) have the channel order read below;
+    # anything else (e.g. BGRA_8888) would silently swap colors
+    if pixel_format not in (1, 2):
+        proc.kill()
+        _SCREENCAP = None
+        raise Exception(f"Unsupported screencap pixel format: {pixel_format}")
+    pixel_bytes = width * height * 4
+    
+    # Read the rest straight into the shared buffer (+4 for the optional colorspace field)
+    if len(_SCREEN_BUF) < pixel_bytes + 4:
+        _SCREEN_BUF = bytearray(pixel_bytes + 4)
+    view = memoryview(_SCREEN_BUF)
+    if _EXTRA_HEADER is None:
+        received = _read_into(proc.stdout, view[:pixel_bytes + 4])
+        proc.wait()
+        if received - pixel_bytes not in (0, 4):
+            view.release()
+            raise Exception("Unexpected screencap output size")
+        _EXTRA_HEADER = received - pixel_bytes
+    elif _read_into(proc.stdout, view[:pixel_bytes + _EXTRA_HEADER]) < pixel_bytes + _EXTRA_HEADER:
+        view.release()
+        proc.kill()
+        _SCREENCAP = None
+        raise Exception("Screencap output ended early")
+    view.release()
+    return width, height, pixel_bytes
+
 
 def capture_screen():
+    """
+    Grab the current screen as an RGB ndarray.
+    The array is a view over a buffer that is reused by the next capture,
+    so copy it if it has to outlive the current level.
+    """
     device_id = get_device_id()
     if not device_id:
         raise Exception("No ADB device found")
     
-    result = subprocess.run(
-        ["adb", "-s", device_id, "exec-out", "screencap", "-p"],
-        capture_output=True
-    )
+    # Raw framebuffer instead of "-p" so the phone doesn't have to PNG-encode every frame.
+    # The first capture runs on its own so we can see where the output ends and learn
+    # the header size; after that frames are requested from the persistent shell.
+    if _EXTRA_HEADER is None:
+        proc = subprocess.Popen(
+            ["adb", "-s", device_id, "exec-out", "screencap"],
+            stdout=subprocess.PIPE
+        )
+    else:
+        proc = _get_screencap_shell(device_id)
+        proc.stdin.write(b"screencap\n")
+        proc.stdin.flush()
+    
+    # None of the reads below time out on their own, so a stalled pipe would hang the bot;
+    # killing the process after SCREENCAP_TIMEOUT ends them and raises instead
+    watchdog = threading.Timer(SCREENCAP_TIMEOUT, proc.kill)
+    watchdog.start()
+    try:
+        width, height, pixel_bytes = _read_frame(proc)
+    finally:
+        watchdog.cancel()
+    
+    pixels = np.frombuffer(_SCREEN_BUF, dtype=np.uint8, count=pixel_bytes, offset=_EXTRA_HEADER)
+    return pixels.reshape(height, width, 4)[:, :, :3]
+
+
+def screen_region(frame, roi=None):
+    """
+    Copy the roi = (x, y, width, height) part of a captured frame (default: all of it)
+    as int16, ready to be compared against another frame.
+    """
+    if roi is not None:
+        x, y, w, h = roi
+        frame = frame[y:y + h, x:x + w]
+    return frame.astype(np.int16)
+
+
+def changed_pixels(current, previous, pixel_threshold=24):
+    """
+    Number of pixels where any channel differs by more than pixel_threshold
+    between two screen_region copies of the same roi.
+    """
+    return np.count_nonzero(np.abs(current - previous).max(axis=-1) > pixel_threshold)
+
+
+def wait_until_stable(roi=None, reference=None, timeout=1.3, poll=0.05, pixel_threshold=24, max_changed=20, quiet_frames=2, change_roi=None):
+    """
+    Poll the screen until it stops changing instead of sleeping for a fixed time.
+    
+    Pixels are compared one by one rather than averaged over the roi, so a liquid
+    level moving a few pixels inside a large region still counts as a change.
     
-    # Skip any warning text and find the PNG data
-    png_start = result.stdout.find(b'\x89PNG')
-    if png_start == -1:
-        raise Exception("No PNG data found in screencap output")
+    Args:
+        roi: (x, y, width, height) part of the screen to watch (default: whole screen)
+        reference: screen_region of change_roi from before the action (e.g. a tap);
+            if given, that region has to change from it before roi can count as stable
+        timeout: give up after this many seconds
+        poll: seconds to wait between captures
+        pixel_threshold: per-channel difference above which a pixel counts as changed
+        max_changed: most changed pixels two frames can have and still be the same
+        quiet_frames: consecutive unchanged captures needed to count as stable
+        change_roi: part of the screen that has to change from reference (default: roi),
+            e.g. only the destination tube, so that lifting the source tube doesn't count
     
-    return Image.open(io.BytesIO(result.stdout[png_start:]))
+    Returns:
+        (frame, settled): the last captured frame (see capture_screen), or None if none
+        was captured, and whether the region changed from reference (if given) and then
+        settled before the timeout
+    """
+    deadline = time.monotonic() + timeout
+    changed = reference is None
+    frame = None
+    previous = None
+    quiet = 0
+    while time.monotonic() < deadline:
+        frame = capture_screen()
+        current = screen_region(frame, roi)
+        if not changed:
+            watched = current if change_roi is None else screen_region(frame, change_roi)
+            changed = changed_pixels(watched, reference, pixel_threshold) > max_changed
+        elif previous is not None:
+            if changed_pixels(current, previous, pixel_threshold) <= max_changed:
+                quiet += 1
+                if quiet >= quiet_frames:
+                    return frame, True
+            else:
+                quiet = 0
+        previous = current
+        time.sleep(poll)
+    return frame, False
 
 
 def has_devices():
-    result = subprocess.run(["adb", "devices"], capture_output=True, text=True)
+    result = subprocess.run(["adb", "devices"], capture_output=True)
     print("ADB Devices:")
-    print(result.stdout)
+    print(result.stdout.decode(errors="replace"))
     
-    if "device" not in result.stdout or result.stdout.count('\n') <= 1:
+    if b"device" not in result.stdout or result.stdout.count(b'\n') <= 1:
         print("❌ No device connected or not authorized!")
         return False
     return True
@@ -45,4 +253,4 @@ def has_devices():
 if __name__ == "__main__":
     while(not has_devices()):
         time.sleep(5)
-    capture_screen().save("art/lvl31.png")
\ No newline at end of file
+    Image.fromarray(capture_screen()).save("art/lvl31.png")
\ No newline at end of file
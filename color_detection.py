@@ -1,11 +1,62 @@
 import cv2
 import numpy as np
 import sys
-from tube_detection import find_tubes
+from tube_detection import find_tubes_in_image, load_image
 
 
+# BGR values the game draws for each liquid.
+# Any pixel that matches none of them is treated as empty space.
+COLOR_TABLE = {
+    (255, 255, 255): "white",
+    (196, 46, 58): "blue",
+    (31, 40, 195): "red",
+    (123, 94, 234): "pink",
+    (87, 217, 241): "yellow",
+    (125, 214, 98): "green",
+    (99, 98, 97): "grey",
+    (220, 156, 82): "lightblue",
+    (0, 100, 255): "orange",
+    (146, 42, 114): "purple",
+    (15, 150, 120): "poop",
+    (51, 50, 45): "black",
+}
+PALETTE_NAMES = list(COLOR_TABLE.values()) + ["empty"]
+EMPTY_CODE = len(COLOR_TABLE)
 
 
+def pack_bgr(b, g, r):
+    """Pack a BGR pixel into a single 24-bit int (works on ints and uint32 arrays)."""
+    return (b << 16) | (g << 8) | r
+
+
+# Max sum of per-channel differences for a pixel to still count as a palette color,
+# so compression noise or dithering doesn't turn liquid into empty space.
+# Palette colors are all more than twice this far apart, so matches never overlap.
+COLOR_TOLERANCE = 30
+
+
+def _build_lut(tolerance):
+    """
+    Build a 24-bit lookup table from packed BGR to palette index, so identifying
+    a whole column of pixels is a single gather.
+    """
+    lut = np.full(1 << 24, EMPTY_CODE, dtype=np.uint8)
+    offsets = np.mgrid[-tolerance:tolerance + 1, -tolerance:tolerance + 1, -tolerance:tolerance + 1].reshape(3, -1).T
+    offsets = offsets[np.abs(offsets).sum(axis=1) <= tolerance]
+    for code, bgr in enumerate(COLOR_TABLE):
+        near = offsets + np.array(bgr)
+        near = near[((near >= 0) & (near <= 255)).all(axis=1)].astype(np.uint32)
+        lut[pack_bgr(near[:, 0], near[:, 1], near[:, 2])] = code
+    return lut
+
+
+_LUT = _build_lut(COLOR_TOLERANCE)
+
+def _palette_codes(pixels):
+    """Map an (N, 3) array of BGR pixels to palette indices."""
+    packed = pack_bgr(pixels[:, 0].astype(np.uint32), pixels[:, 1].astype(np.uint32), pixels[:, 2].astype(np.uint32))
+    return _LUT[packed]
+
 
 def detect_colors_in_tube(img, tube, index, scan_offset=30):
     """
@@ -20,41 +71,62 @@ def detect_colors_in_tube(img, tube, index, scan_offset=30):
     Returns:
         List of dictionaries containing color info and positions
     """
-    x, y, w, h = tube['x'], tube['y'], tube['width'], tube['height']
-    
-    # Calculate the x-position of the scan line (70px from right border)
-    scan_x = x + w - scan_offset
-    
-    # Make sure scan_x is within bounds
-    if scan_x < x or scan_x >= x + w:
-        print(f"Warning: Scan line out of bounds for tube at ({x}, {y})")
-        return []
-    
-    colors_found = []
-    # Scan from top to bottom of the tube
-    for scan_y in range(y + 68, y + h):
-        # Get the pixel color at this position
-        pixel = img[scan_y, scan_x]
-        b, g, r = int(pixel[0]), int(pixel[1]), int(pixel[2])
+    return detect_colors_in_tubes(img, [tube], scan_offset)[0]
+
 
+def detect_colors_in_tubes(img, tubes, scan_offset=30):
+    """
+    Same as detect_colors_in_tube, but for every tube at once: the
+    scan lines of all tubes are read and identified in a single batch.
+    
+    Returns:
+        One list of color segments per tube, in the same order as tubes
+    """
+    colors_per_tube = [[] for _ in tubes]
+    scanned = []
+    for i, tube in enumerate(tubes):
+        x, y, w, h = tube['x'], tube['y'], tube['width'], tube['height']
         
-        # Identify the color or empty space
-        color_name = identify_color(r, g, b)
+        # Calculate the x-position of the scan line (70px from right border)
+        scan_x = x + w - scan_offset
         
-        # Group consecutive pixels of the same color
-        if colors_found and colors_found[-1]['color'] == color_name:
-            colors_found[-1]['end_y'] = scan_y
-            colors_found[-1]['height'] += 1
-        else:
-            colors_found.append({
-                'color': color_name,
+        # Make sure scan_x is within bounds
+        if scan_x < x or scan_x >= x + w:
+            print(f"Warning: Scan line out of bounds for tube at ({x}, {y})")
+            continue
+        if h > 68:
+            scanned.append((i, y + 68, h - 68, scan_x))
+    if not scanned:
+        return colors_per_tube
+
+    indices, top_ys, lengths, scan_xs = (np.array(v) for v in zip(*scanned))
+
+    # Identify every pixel of every scan line in one gather. Shorter tubes repeat their last row.
+    rows = np.minimum(np.arange(lengths.max())[None, :], lengths[:, None] - 1)
+    pixels = img[top_ys[:, None] + rows, scan_xs[:, None]]
+    codes_per_line = _palette_codes(pixels.reshape(-1, 3)).reshape(rows.shape)
+    changes = np.diff(codes_per_line, axis=1) != 0
+
+    for row, (i, top_y, length, scan_x) in enumerate(zip(indices.tolist(), top_ys.tolist(), lengths.tolist(), scan_xs.tolist())):
+        col = img[top_y:top_y + length, scan_x]
+
+        # A new segment starts wherever the color changes
+        starts = np.append(0, np.flatnonzero(changes[row, :length - 1]) + 1)
+        ends = np.append(starts[1:], length)
+        codes = codes_per_line[row, starts]
+
+        for start, end, code in zip(starts.tolist(), ends.tolist(), codes.tolist()):
+            b, g, r = (int(v) for v in col[start])
+            colors_per_tube[i].append({
+                'color': PALETTE_NAMES[code],
+                'color_id': code,
                 'rgb': (r, g, b),
-                'start_y': scan_y,
-                'end_y': scan_y,
-                'height': 1,
+                'start_y': top_y + start,
+                'end_y': top_y + end - 1,
+                'height': end - start,
                 'scan_x': scan_x
             })
-    return colors_found
+    return colors_per_tube
 
 
 def identify_color(r, g, b):
@@ -62,101 +134,68 @@ def identify_color(r, g, b):
     Identify the color name based on RGB values.
     Specifically tuned for this puzzle game.
     """
+    return PALETTE_NAMES[_LUT[pack_bgr(b, g, r)]]
 
-    if b == 255 and g == 255 and r == 255:
-        return "white"
-    
-    # Dark Blue: RGB(58, 46, 196) - very high blue, low red and green
-    # B should be > 150 and much greater than R and G
-    if b == 196 and g == 46 and r == 58:
-        return "blue"
-    
-    # Red (dark red): RGB(195, 40, 31) - high R, very low G and B
-    if b == 31 and g == 40 and r == 195:
-        return "red"
-    
-    # Pink: RGB(234, 94, 123) - high R, medium G and B
-    if b == 123 and g == 94 and r == 234:
-        return "pink"
-    
-    # Yellow: RGB(241, 217, 87) - high R and G, low B
-    if b == 87 and g == 217 and r == 241:
-        return "yellow"
-    
-    # Green: RGB(98, 214, 125) - very high G, lower R and B
-    if b == 125 and g == 214 and r == 98:
-        return "green"
-    
-    # Grey
-    if b == 99 and g == 98 and r == 97:
-        return "grey"
 
-    # Light blue
-    if b == 220 and g == 156 and r == 82:
-        return "lightblue"
-    
-    #orange
-    if b==0 and g==100 and r == 255:
-        return "orange"
-    
-    #purple
-    if b == 146 and g == 42 and r == 114:
-        return "purple"
-    
-    #poop
-    if b==15 and g == 150 and r == 120:
-        return "poop"
-    
-    # Check for black/dark (all values low)
-    if b == 51 and g == 50 and r == 45:
-        return "black"
-    
-    else:
-        return "empty"
-    
-    return "unknown"
+def _significant_colors(colors):
+    """
+    Filter out very small segments (likely noise) and background/empty at top and bottom.
+    """
+    significant_colors = []
+    for c in colors:
+        # Skip small segments (must be at least 22px tall to be a real color block)
+        if c['height'] < 22:
+            continue
+        # Skip background and empty space (these are the tube walls and empty areas)
+        # if c['color'] in ['background', 'empty']:
+        #     continue
+        significant_colors.append(c)
+    return significant_colors
 
 
 def analyze_all_tubes(image_path, scan_offset=30):
     """
     Analyze all tubes in the image and return color information.
     """
-    # Find tubes using the tube_detection module
-    tubes, img, binary = find_tubes(image_path)
+    img = load_image(image_path)
+    
+    # Find tubes using the tube_detection module. This is redone on every frame:
+    # it's cheap next to a capture, and tubes remembered from an earlier frame
+    # would be scanned on screens that no longer show them (e.g. the win screen).
+    tubes, binary = find_tubes_in_image(img)
     
     all_tube_colors = []
+    # Report lines for every tube, printed with a single call once all tubes are done
+    report = []
     
-    for i, tube in enumerate(tubes):
+    # Detect colors in every tube in one batch
+    significant_per_tube = [_significant_colors(colors) for colors in detect_colors_in_tubes(img, tubes, scan_offset)]
+    
+    for i, (tube, significant_colors) in enumerate(zip(tubes, significant_per_tube)):
         # print(f"\n=== Tube {i+1} at ({tube['x']}, {tube['y']}) ===")
         
-        # Detect colors in this tube
-        colors = detect_colors_in_tube(img, tube, i, scan_offset)
+        # Nothing to read in this tube, leave it out
+        if not significant_colors:
+            continue
         
-        # Filter out very small segments (likely noise) and background/empty at top and bottom
-        significant_colors = []
-        for c in colors:
-            # Skip small segments (must be at least 22px tall to be a real color block)
-            if c['height'] < 22:
-                continue
-            # Skip background and empty space (these are the tube walls and empty areas)
-            # if c['color'] in ['background', 'empty']:
-            #     continue
-            significant_colors.append(c)
-        
-        print(f"Colors found (top to bottom):")
+        report.append("Colors found (top to bottom):")
         for color_segment in significant_colors:
-            print(f"  {color_segment['color']:10s} - "
-                  f"{color_segment['height']:3d}px tall - "
-                  f"RGB({color_segment['rgb'][0]:3d}, {color_segment['rgb'][1]:3d}, {color_segment['rgb'][2]:3d})")
+            report.append(f"  {color_segment['color']:10s} - "
+                          f"{color_segment['height']:3d}px tall - "
+                          f"RGB({color_segment['rgb'][0]:3d}, {color_segment['rgb'][1]:3d}, {color_segment['rgb'][2]:3d})")
         
         all_tube_colors.append({
             'tube_index': i + 1,
             'tube_position': (tube['x'], tube['y']),
+            'tube_size': (tube['width'], tube['height']),
             'colors': significant_colors,
             'top_color': significant_colors[0],
             'pour_color': significant_colors[1] if significant_colors[0]['color'] == 'empty' and len(significant_colors)>1 else significant_colors[0]
         })
     
+    if report:
+        print("\n".join(report))
+    
     return all_tube_colors, img
 
 
@@ -0,0 +1,8 @@
+from game_logic.planner import (
+    choose_pour,
+    get_largest_continuous_top_color_tube,
+    get_pour_region,
+    get_tap_position,
+    get_tube_tap_positions,
+    plan_pour,
+)
@@ -0,0 +1,143 @@
+import numpy as np
+from collections import OrderedDict, defaultdict
+from color_detection import EMPTY_CODE
+
+def get_tap_position(tube):
+    tap_x = tube['top_color']['scan_x']
+    tap_y = tube['top_color']['start_y'] + (tube['top_color']['height'] / 2)
+    return (tap_x, tap_y)
+
+def get_tube_tap_positions(tubes):
+    """
+    Tap point of every tube, as a (len(tubes), 2) int32 array of (x, y): the middle of
+    the tube on the scan line. Unlike get_tap_position this doesn't depend on the liquid,
+    so it stays valid while a planned solution is played.
+    """
+    geometry = np.array([(t['top_color']['scan_x'], t['tube_position'][1], t['tube_size'][1]) for t in tubes], dtype=np.int32).reshape(-1, 3)
+    return np.column_stack((geometry[:, 0], geometry[:, 1] + geometry[:, 2] // 2))
+
+def get_pour_region(*tubes):
+    # Screen box (x, y, width, height) covering all the given tubes,
+    # i.e. where a pour between them is animated
+    left = min(tube['tube_position'][0] for tube in tubes)
+    top = min(tube['tube_position'][1] for tube in tubes)
+    right = max(tube['tube_position'][0] + tube['tube_size'][0] for tube in tubes)
+    bottom = max(tube['tube_position'][1] + tube['tube_size'][1] for tube in tubes)
+    return (left, top, right - left, bottom - top)
+
+def get_largest_continuous_top_color_tube(working_tubes, available_pouring_colors):
+    # Tally the pourable height per color and keep the running winner in the same pass:
+    # the color with the most height (earliest seen on ties) and the first tube showing it
+    colors = {}
+    first_tube = {}
+    most_color = None
+    available_pouring_colors = set(available_pouring_colors)
+    # An empty tube can take any color
+    any_color = EMPTY_CODE in available_pouring_colors
+    for tube in working_tubes:
+            pour_segment = tube['pour_color']
+            pour_color = pour_segment['color_id']
+
+            if any_color or pour_color in available_pouring_colors:
+                if pour_color in colors:
+                    total = colors[pour_color] + pour_segment['height']
+                else:
+                    total = pour_segment['height']
+                    first_tube[pour_color] = (len(first_tube), tube)
+                colors[pour_color] = total
+                if most_color is None or (total, -first_tube[pour_color][0]) > (colors[most_color], -first_tube[most_color][0]):
+                    most_color = pour_color
+    if most_color is None:
+        return None
+    return first_tube[most_color][1]
+
+def choose_pour(all_tube_colors):
+    """
+    Pick the next pour for the analyzed board.
+    Returns (tube to pour from, tube to pour into), or (None, None) when there is nothing left to pour.
+    """
+    #Now that we know where everything is, we can designate 'pour tubes' (ones that are empty or contain 1 color) and 'working tubes' (tubes we need to get down to 1 color)
+    working_tubes, pour_tubes = [], []
+
+    for tube in all_tube_colors:
+        if len(tube['colors']) == 1 or len(tube['colors']) == 2 and tube['top_color']['color_id'] == EMPTY_CODE:
+            pour_tubes.append(tube)
+        else:
+            working_tubes.append(tube)
+
+    #Get a list of all colors that have a pour tube we can use so we don't mix colors up
+    available_pouring_colors = [tube['colors'][-1]['color_id'] for tube in pour_tubes]
+    #Now we can follow a simple pattern of scanning the working tubes for the largest color that we can put into a pour tube!
+    largest_continuous_color = get_largest_continuous_top_color_tube(working_tubes, available_pouring_colors)
+    if largest_continuous_color is None:
+        # If we have no working tubes to pour, its time to combine any alike pour-tubes
+        filled_pour_tubes = [tube for tube in pour_tubes if not (len(tube['colors'])==1 and tube['top_color']['color_id'] == EMPTY_CODE)]
+        pour_tubes_by_color = defaultdict(list)
+        for tube in filled_pour_tubes:
+            pour_tubes_by_color[tube['colors'][-1]['color_id']].append(tube)
+        for tube in reversed(filled_pour_tubes):
+            if len(pour_tubes_by_color[tube['colors'][-1]['color_id']]) >= 2:
+                largest_continuous_color = tube
+                break
+
+    if largest_continuous_color is None:
+        # If we still haven't found one to pour, lets try combining 2 working tubes!
+        # Working tubes with space on top, grouped by the color right under the empty space
+        open_tubes_by_color = defaultdict(list)
+        for tube in working_tubes:
+            if tube['top_color']['color_id'] == EMPTY_CODE:
+                open_tubes_by_color[tube['colors'][1]['color_id']].append(tube)
+        for x in working_tubes:
+            x_index = x['tube_index']
+            x_pour_segment = x['pour_color']
+            min_space = x_pour_segment['height'] - 10 # margin of error
+            for y in open_tubes_by_color.get(x_pour_segment['color_id'], []):
+                if x_index == y['tube_index']:
+                    continue
+                if y['colors'][0]['height'] >= min_space:
+                    largest_continuous_color = x
+                    pour_tubes.append(y)
+                    break
+            if largest_continuous_color is not None:
+                break
+
+    if largest_continuous_color is None:
+        return None, None
+
+    pour_tubes = [tube for tube in pour_tubes if tube['tube_index'] != largest_continuous_color['tube_index']]
+
+    #Now that we have the tube we want to pour, we need the tube to pour it into. we know 1 exists but not where!
+    color_to_pour = largest_continuous_color['pour_color']['color_id']
+    tube_to_pour_in = None
+    for tube in pour_tubes:
+        if tube['colors'][0]['color_id'] == color_to_pour or tube['colors'][-1]['color_id'] == EMPTY_CODE or (tube['colors'][0]['color_id'] == EMPTY_CODE and tube['colors'][1]['color_id'] == color_to_pour):
+            tube_to_pour_in = tube
+            break
+
+    return largest_continuous_color, tube_to_pour_in
+
+# Pours already chosen for recently seen boards, keyed on every tube's (color id, height) segments,
+# so a board that comes back (e.g. a tap that didn't register) isn't planned again
+_plan_cache = OrderedDict()
+
+def plan_pour(all_tube_colors):
+    """
+    choose_pour, memoized on the board state. Returns the tubes of the given analysis.
+    """
+    key = tuple(
+        (tube['tube_index'], tuple((c['color_id'], c['height']) for c in tube['colors']))
+        for tube in all_tube_colors
+    )
+    if key in _plan_cache:
+        _plan_cache.move_to_end(key)
+    else:
+        from_tube, to_tube = choose_pour(all_tube_colors)
+        _plan_cache[key] = (
+            from_tube['tube_index'] if from_tube is not None else None,
+            to_tube['tube_index'] if to_tube is not None else None,
+        )
+        if len(_plan_cache) > 1024:
+            _plan_cache.popitem(last=False)
+    tubes_by_index = {tube['tube_index']: tube for tube in all_tube_colors}
+    from_index, to_index = _plan_cache[key]
+    return tubes_by_index.get(from_index), tubes_by_index.get(to_index)
@@ -0,0 +1,101 @@
+import sys
+import hashlib
+import subprocess
+import numpy as np
+from time import sleep
+from color_detection import analyze_all_tubes
+from adb import adb_tap, adb_tap_pair, adb_taps, capture_screen, screen_region, wait_until_stable
+from solver import board_from_analysis, solve
+from game_logic.planner import get_tap_position, get_tube_tap_positions, get_pour_region, plan_pour
+
+# Results of the last few analyzed frames, keyed on a hash of a downsampled copy of the frame.
+# Frames captured while nothing has changed (e.g. a tap that didn't register) reuse them.
+_analysis_cache = {}
+
+def analyze_screen(image, scan_offset=40):
+    key = hashlib.blake2b(np.ascontiguousarray(image[::16, ::16]).tobytes(), digest_size=8).digest()
+    if key not in _analysis_cache:
+        if len(_analysis_cache) >= 4:
+            del _analysis_cache[next(iter(_analysis_cache))]
+        _analysis_cache[key] = analyze_all_tubes(image, scan_offset=scan_offset)
+    return _analysis_cache[key]
+
+def play_solution(all_tube_colors, moves, frame):
+    """
+    Tap out a planned list of (from_index, to_index) pours, waiting for each pour
+    animation to finish before starting the next one.
+
+    Stops early when a pour doesn't show up on screen (e.g. a dropped tap), since the
+    remaining moves would then be played on a board that isn't there.
+    Returns whether every move was played.
+    """
+    tap_positions = get_tube_tap_positions(all_tube_colors)
+    for from_idx, to_idx in moves:
+        print("pouring from tube " + str(all_tube_colors[from_idx]['tube_index']) + ' into tube ' + str(all_tube_colors[to_idx]['tube_index']))
+        # The pour has started once the destination tube changes (the first tap only lifts
+        # the source), and is over once both tubes are still
+        pour_region = get_pour_region(all_tube_colors[from_idx], all_tube_colors[to_idx])
+        destination = get_pour_region(all_tube_colors[to_idx])
+        before_pour = screen_region(frame, destination)
+        adb_taps(tap_positions[[from_idx, to_idx]].tolist())
+        frame, settled = wait_until_stable(pour_region, before_pour, timeout=1.3, change_roi=destination)
+        if not settled:
+            return False
+    return True
+
+def next_level(frame):
+    """
+    Tap through to the next level once the end-of-level screen has replaced the given frame.
+    """
+    # The solved board is already still, so wait for the screen to change first
+    wait_until_stable(reference=screen_region(frame), timeout=3)
+    adb_tap(456, 1775)
+    print("tap")
+    sleep(1)
+
+def run():
+    # Recording shares the adb connection with every screencap and slows captures down,
+    # so it's opt-in (--record) and kept at a low resolution/bitrate when enabled
+    if "--record" in sys.argv:
+        screenrecord_proc = subprocess.Popen(
+            ["adb", "shell", "screenrecord", "--time-limit", "180", "--bit-rate", "2000000",
+             "--size", "720x1280", "/sdcard/bot_recording.mp4"]
+        )
+    playing = True
+    while playing:
+        image = capture_screen()
+
+        #Level begins, we need to first analyze all tubes to get the lists of colors and empty spaces
+        all_tube_colors, img = analyze_screen(image, scan_offset=40)
+
+        # When every tube reads as whole units of liquid, solve the level up front
+        # and play the whole solution before looking at the screen again
+        board = board_from_analysis(all_tube_colors)
+        moves = solve(board) if board is not None else None
+        if moves:
+            # If the board stops matching the plan, the next capture is analyzed and solved again
+            play_solution(all_tube_colors, moves, image)
+            continue
+
+        # Otherwise (e.g. hidden colors) fall back to picking one pour at a time
+        largest_continuous_color, tube_to_pour_in = plan_pour(all_tube_colors)
+        if largest_continuous_color is None:
+            next_level(image)
+            continue
+
+        print("pouring from tube " + str(largest_continuous_color['tube_index']) + ' into tube ' + str(tube_to_pour_in['tube_index']))
+        # Now we just tap on both tubes, and repeat!
+        tube_1_tap_pos = get_tap_position(largest_continuous_color)
+        tube_2_tap_pos = get_tap_position(tube_to_pour_in)
+
+        # Wait for the pour animation to play out instead of a fixed sleep: it starts when
+        # the destination tube changes and is over once both tubes are still
+        pour_region = get_pour_region(largest_continuous_color, tube_to_pour_in)
+        destination = get_pour_region(tube_to_pour_in)
+        before_pour = screen_region(image, destination)
+        adb_tap_pair(*tube_1_tap_pos, *tube_2_tap_pos)
+        wait_until_stable(pour_region, before_pour, timeout=1.3, change_roi=destination)
+
+
+if __name__ == "__main__":
+    run()
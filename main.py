@@ -0,0 +1,4 @@
+from game_logic.runner import run
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,168 @@
+import heapq
+from collections import defaultdict
+from functools import lru_cache
+from color_detection import EMPTY_CODE
+
+# Units of liquid a tube holds
+TUBE_CAPACITY = 4
+
+
+def board_from_analysis(all_tube_colors, capacity=TUBE_CAPACITY):
+    """
+    Turn the output of analyze_all_tubes into a board for the solver: a tuple with
+    one tuple per tube holding its color ids from bottom to top, one entry per unit.
+
+    Returns None if the tubes can't be read as whole units of liquid
+    (e.g. a screen that isn't a level, or a color that doesn't fill exactly one tube).
+    """
+    board = []
+    color_units = {}
+    for tube in all_tube_colors:
+        # Every tube is scanned over its full height, so its segments add up to `capacity` units
+        unit_px = sum(c['height'] for c in tube['colors']) / capacity
+        stack = []
+        total_units = 0
+        for c in reversed(tube['colors']):
+            units = round(c['height'] / unit_px)
+            total_units += units
+            if c['color_id'] != EMPTY_CODE:
+                stack.extend([c['color_id']] * units)
+                color_units[c['color_id']] = color_units.get(c['color_id'], 0) + units
+        if total_units != capacity:
+            return None
+        board.append(tuple(stack))
+    if any(units != capacity for units in color_units.values()):
+        return None
+    return tuple(board)
+
+
+def is_solved(board, capacity=TUBE_CAPACITY):
+    # Every tube is empty or one full run of a color (which then can't be anywhere else,
+    # since every color has exactly `capacity` units)
+    return all(not tube or top_run(tube)[1] == capacity for tube in board)
+
+
+# The same tubes show up in a great many boards, so facts about a single tube
+# are cached on the tube tuple instead of being recomputed for every board
+
+@lru_cache(maxsize=8192)
+def top_run(tube):
+    """Color and length of the run of one color on top of a non-empty tube."""
+    color = tube[-1]
+    run = 1
+    while run < len(tube) and tube[-run - 1] == color:
+        run += 1
+    return color, run
+
+
+@lru_cache(maxsize=8192)
+def count_runs(tube):
+    """Number of runs of one color in a tube."""
+    return sum(1 for k, color in enumerate(tube) if k == 0 or tube[k - 1] != color)
+
+
+def get_moves(board, capacity=TUBE_CAPACITY):
+    """
+    Yield every useful pour as (from_index, to_index, units poured).
+    A pour moves the whole top run of one color, or as much of it as fits.
+    """
+    # Tubes that still have room, grouped by their top color, so each source only
+    # looks at the tubes it can pour into. All empty tubes are alike, so only the
+    # first one is offered (pouring into any other gives the same board).
+    open_by_top = defaultdict(list)
+    first_empty = None
+    for j, dst in enumerate(board):
+        if not dst:
+            if first_empty is None:
+                first_empty = j
+        elif len(dst) < capacity:
+            open_by_top[dst[-1]].append(j)
+    for i, src in enumerate(board):
+        if not src:
+            continue
+        color, run = top_run(src)
+        if run == len(src) == capacity:
+            continue  # already sorted
+        for j in open_by_top.get(color, ()):
+            if i != j:
+                yield i, j, min(run, capacity - len(board[j]))
+        # Moving a single-color tube into an empty one changes nothing
+        if first_empty is not None and run < len(src):
+            yield i, first_empty, run
+
+
+@lru_cache(maxsize=8192)
+def pour(src, dst, units):
+    """The (source, destination) tubes after pouring `units` from src into dst."""
+    return src[:-units], dst + src[-units:]
+
+
+def apply_move(board, from_idx, to_idx, units):
+    tubes = list(board)
+    tubes[from_idx], tubes[to_idx] = pour(board[from_idx], board[to_idx], units)
+    return tuple(tubes)
+
+
+def canonical(board):
+    """
+    Key that is the same for boards that only differ in the order of their tubes
+    (e.g. which of the empty tubes a color was poured into).
+    """
+    return tuple(sorted(board))
+
+
+def count_colors(board):
+    return len({color for tube in board for color in tube})
+
+
+def heuristic(board, num_colors=None):
+    """
+    Lower bound on the pours left: a pour joins at most two runs of color,
+    and a solved board has exactly one run per color.
+    Pouring never adds or removes a color, so num_colors can be passed in once per search.
+    """
+    if num_colors is None:
+        num_colors = count_colors(board)
+    return sum(count_runs(tube) for tube in board) - num_colors
+
+
+def solve(board, capacity=TUBE_CAPACITY, max_states=200000):
+    """
+    A* search for the shortest sequence of pours that sorts the board.
+
+    Returns:
+        List of (from_index, to_index) pours, or None if no solution was found
+        within max_states expanded boards
+    """
+    start = tuple(board)
+    # Boards are looked up by their canonical key, but the boards themselves keep their
+    # tube order so the recorded pours refer to the actual tubes on screen
+    cost = {canonical(start): 0}
+    came_from = {canonical(start): None}
+    num_colors = count_colors(start)
+    # Entries are (estimated total pours, -pours so far, push order, board): among boards
+    # with the same estimate, the one furthest along is expanded first
+    frontier = [(heuristic(start, num_colors), 0, 0, start)]
+    pushed = 1
+    expanded = 0
+    while frontier and expanded < max_states:
+        _, neg_g, _, state = heapq.heappop(frontier)
+        g = -neg_g
+        if g > cost[canonical(state)]:
+            continue
+        if is_solved(state, capacity):
+            moves = []
+            while came_from[canonical(state)] is not None:
+                state, move = came_from[canonical(state)]
+                moves.append(move)
+            return moves[::-1]
+        expanded += 1
+        for from_idx, to_idx, units in get_moves(state, capacity):
+            child = apply_move(state, from_idx, to_idx, units)
+            key = canonical(child)
+            if key not in cost or g + 1 < cost[key]:
+                cost[key] = g + 1
+                came_from[key] = (state, (from_idx, to_idx))
+                heapq.heappush(frontier, (g + 1 + heuristic(child, num_colors), -(g + 1), pushed, child))
+                pushed += 1
+    return None
@@ -1,15 +1,35 @@
 import cv2
 import numpy as np
 
-def find_tubes(image):
+def load_image(image):
     """
-    Find test tubes in the image - they are vertical rectangles (151x544 pixels).
+    Read a screenshot (file path, PIL image or RGB array) as a BGR image.
     """
-    # Read the image
-    img = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    # Paths are decoded straight to BGR by OpenCV,
+    # screenshots (PIL images or RGB arrays) are converted without an extra copy
+    if isinstance(image, str):
+        img = cv2.imread(image, cv2.IMREAD_COLOR)
+    else:
+        img = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
     if img is None:
         raise ValueError(f"Could not read image: {image}")
-    
+    return img
+
+
+def find_tubes(image):
+    """
+    Find test tubes in the image - they are vertical rectangles (151x544 pixels).
+    """
+    img = load_image(image)
+    detected_tubes, binary = find_tubes_in_image(img)
+    return detected_tubes, img, binary
+
+
+def find_tubes_in_image(img):
+    """
+    Same as find_tubes, but for an image that is already loaded as BGR.
+    Returns the detected tubes and the thresholded image.
+    """
     # Convert to grayscale
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     
@@ -23,54 +43,54 @@ def find_tubes(image):
     
     # print(f"Total contours found: {len(contours)}\n")
     
-    for i, contour in enumerate(contours):
-        # Get bounding box
-        x, y, w, h = cv2.boundingRect(contour)
+    # Get all bounding boxes at once
+    boxes = np.array([cv2.boundingRect(contour) for contour in contours], dtype=np.int32).reshape(-1, 4)
+    
+    # Look for vertical rectangles approximately 151 wide and 544 tall
+    # Allow some tolerance (±10 pixels)
+    widths, heights = boxes[:, 2], boxes[:, 3]
+    tube_mask = (110 <= widths) & (widths <= 165) & (400 <= heights) & (heights <= 560)
+    
+    for x, y, w, h in boxes[tube_mask].tolist():
+        # Calculate aspect ratio (should be around 0.28 for tubes)
+        aspect_ratio = w / h if h > 0 else 0
         
-        # Look for vertical rectangles approximately 151 wide and 544 tall
-        # Allow some tolerance (±10 pixels)
-        width_ok = 110 <= w <= 165
-        height_ok = 400 <= h <= 560
+        # Extract the region of interest
+        roi = binary[y:y+h, x:x+w]
+        white_pixels = cv2.countNonZero(roi)
+        total_pixels = w * h
+        fill_percentage = (white_pixels / total_pixels) * 100
         
-        if width_ok and height_ok:
-            # Calculate aspect ratio (should be around 0.28 for tubes)
-            aspect_ratio = w / h if h > 0 else 0
-            
-            # Extract the region of interest
-            roi = binary[y:y+h, x:x+w]
-            white_pixels = np.sum(roi == 255)
-            total_pixels = w * h
-            fill_percentage = (white_pixels / total_pixels) * 100
-            
-            # print(f"✓ TUBE FOUND:")
-            # print(f"  Position: ({x}, {y})")
-            # print(f"  Size: {w} x {h} pixels")
-            # print(f"  Aspect ratio: {aspect_ratio:.2f}")
-            # print(f"  Fill: {fill_percentage:.1f}% white")
-            # print()
-            
-            detected_tubes.append({
-                'x': x,
-                'y': y,
-                'width': w,
-                'height': h,
-                'center': (x + w // 2, y + h // 2),
-                'top_center': (x + w // 2, y),  # Center of the top edge
-                'fill_percentage': fill_percentage,
-                'aspect_ratio': aspect_ratio
-            })
+        # print(f"✓ TUBE FOUND:")
+        # print(f"  Position: ({x}, {y})")
+        # print(f"  Size: {w} x {h} pixels")
+        # print(f"  Aspect ratio: {aspect_ratio:.2f}")
+        # print(f"  Fill: {fill_percentage:.1f}% white")
+        # print()
+        
+        detected_tubes.append({
+            'x': x,
+            'y': y,
+            'width': w,
+            'height': h,
+            'center': (x + w // 2, y + h // 2),
+            'top_center': (x + w // 2, y),  # Center of the top edge
+            'fill_percentage': fill_percentage,
+            'aspect_ratio': aspect_ratio
+        })
     
     # Sort by Y position (top to bottom) then X position (left to right)
     detected_tubes.sort(key=lambda t: (t['y'], t['x']))
     
-    return detected_tubes, img, binary
+    return detected_tubes, binary
 
 
-def visualize_tubes(image, tubes, output_path='result.jpg'):
+def visualize_tubes(image, tubes, output_path='result.jpg', inplace=False):
     """
     Draw detected tubes on the image and save it.
+    With inplace=True the boxes are drawn onto image itself instead of a copy.
     """
-    result = image.copy()
+    result = image if inplace else image.copy()
     
     for i, tube in enumerate(tubes):
         x, y, w, h = tube['x'], tube['y'], tube['width'], tube['height']
@@ -92,9 +112,9 @@ def visualize_tubes(image, tubes, output_path='result.jpg'):
 
 # Example usage
 if __name__ == "__main__":
-    image_path = "lvl8.png"
+    image_path = "art/lvl8.png"
     
-    # Find tubes
+    # Find tubes once; the returned image and mask are reused below
     tubes, original_img, binary_img = find_tubes(image_path)
     
     print(f"=== Found {len(tubes)} tubes ===\n")
@@ -108,7 +128,7 @@ if __name__ == "__main__":
     
     # Visualize and save results
     # if len(tubes) > 0:
-    #     result = visualize_tubes(original_img, tubes, 'detected_tubes.jpg')
+    #     result = visualize_tubes(original_img, tubes, 'detected_tubes.jpg', inplace=True)
     #     print("Result saved to 'detected_tubes.jpg'")
     
     # Save binary image